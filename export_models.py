@@ -0,0 +1,99 @@
+from onnxruntime.quantization import (
+    CalibrationDataReader, QuantFormat, QuantType, quantize_static
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+from ultralytics import YOLO
+from ultralytics.data.utils import check_det_dataset
+import onnx
+import cv2
+import glob
+import os
+import shutil
+
+from yolo_utils import Preprocessor
+
+
+# YOLOv8n is kept at full precision as the reference model
+FP32_MODELS = [
+    "/app/models/yolov8n.pt"
+]
+
+INT8_MODELS = [
+    "/app/models/yolov5nu.pt",
+    "/app/models/yolov10n.pt"
+]
+
+
+class CalibrationReader(CalibrationDataReader):
+    """Feeds letterboxed calibration images to the static quantizer"""
+
+    def __init__(self, input_name, image_dir, num_images=128, imgsz=640):
+        self.input_name = input_name
+        self.preprocess = Preprocessor(imgsz)
+        self.paths = iter(sorted(glob.glob(os.path.join(image_dir, "*.jpg")))[:num_images])
+
+    def get_next(self):
+        path = next(self.paths, None)
+        if path is None:
+            return None
+        # the preprocessor reuses its buffer, so hand the quantizer a copy
+        return {self.input_name: self.preprocess(cv2.imread(path)).tensor.copy()}
+
+
+def export_onnx(weights_path, imgsz=640):
+    """Export a checkpoint to ONNX"""
+    return YOLO(weights_path).export(format="onnx", imgsz=imgsz)
+
+
+def detect_head_nodes(model, weights_path):
+    """Box decoding nodes of the Detect head, which must stay in float
+
+    The head concatenates pixel coordinates and class scores into one
+    output, so a shared INT8 scale would wipe out the scores.
+    """
+    head = f"/model.{len(YOLO(weights_path).model.model) - 1}/"
+    return [
+        node.name for node in model.graph.node
+        if node.name.startswith(head) and (node.op_type != "Conv" or "/dfl/" in node.name)
+    ]
+
+
+def export_int8(weights_path, image_dir, imgsz=640):
+    """Export a checkpoint to ONNX and statically quantize it to INT8"""
+    onnx_path = export_onnx(weights_path, imgsz)
+    prep_path = onnx_path.replace(".onnx", "_prep.onnx")
+    int8_path = onnx_path.replace(".onnx", "_int8.onnx")
+
+    quant_pre_process(onnx_path, prep_path)
+    exported = onnx.load(prep_path)
+
+    quantize_static(
+        prep_path,
+        int8_path,
+        CalibrationReader(exported.graph.input[0].name, image_dir, imgsz=imgsz),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        nodes_to_exclude=detect_head_nodes(exported, weights_path)
+    )
+    os.remove(prep_path)
+
+    # carry the class names and export metadata over to the quantized model
+    quantized = onnx.load(int8_path)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(onnx.load(onnx_path).metadata_props)
+    onnx.save(quantized, int8_path)
+
+    return int8_path
+
+
+if __name__ == "__main__":
+    for weights_path in FP32_MODELS:
+        print(f"Exported {export_onnx(weights_path)}")
+
+    # COCO128 images calibrate the activation ranges
+    calibration = check_det_dataset("coco128.yaml")
+    for weights_path in INT8_MODELS:
+        print(f"Exported {export_int8(weights_path, calibration['train'])}")
+    shutil.rmtree(calibration["path"], ignore_errors=True)
\ No newline at end of file
@@ -1,13 +1,21 @@
-import json
+import orjson
 import traceback
+import os
 import sys
+import math
 import time
+import queue
+import threading
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import multiprocessing
+import numpy as np
 
 from waggle.plugin import Plugin
-from waggle.data.vision import Camera
+from waggle.data.vision import Camera, BGR
+
+# tmpfs when available, so the only disk write of a published snapshot is
+# upload_file moving it into pywaggle's upload directory
+SNAPSHOT_PATH = os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else ".", "snapshot.jpg")
+
 
 def should_publish_image():
     """Check if current minute is a multiple of 5"""
@@ -15,10 +23,59 @@ def should_publish_image():
     return current_minute % 5 == 0
 
 
-def run_model_detection(model_name, model_instance, image_data):
-    """Run detection for a single model - used for parallel execution"""
+def available_cpus(cgroup_root="/sys/fs/cgroup"):
+    """CPUs this container may use: its affinity mask capped by the CFS quota"""
+    cpus = len(os.sched_getaffinity(0))
+    
+    # cgroup v2 exposes "<quota> <period>", v1 splits them across two files
     try:
-        detection_result = model_instance.detect(image_data)
+        with open(os.path.join(cgroup_root, "cpu.max")) as f:
+            quota, period = f.read().split()
+        quota = -1 if quota == "max" else int(quota)
+    except (OSError, ValueError):
+        try:
+            with open(os.path.join(cgroup_root, "cpu", "cpu.cfs_quota_us")) as f:
+                quota = int(f.read())
+            with open(os.path.join(cgroup_root, "cpu", "cpu.cfs_period_us")) as f:
+                period = f.read()
+        except (OSError, ValueError):
+            quota = -1
+    
+    if quota > 0:
+        cpus = min(cpus, math.ceil(quota / int(period)))
+    return max(1, cpus)
+
+
+def capture_snapshots(camera, snapshot_queue, frame_requested, stop_event):
+    """Take one snapshot each time the models ask for one - used as the producer thread"""
+    while not stop_event.is_set():
+        # the main loop sets the event when it takes a frame, so exactly one
+        # snapshot is captured per cycle while the models work
+        if not frame_requested.wait(timeout=1):
+            continue
+        frame_requested.clear()
+        
+        try:
+            item = camera.snapshot()
+        except Exception as e:
+            item = e
+        
+        # block while the queue is full, but keep watching for shutdown
+        while not stop_event.is_set():
+            try:
+                snapshot_queue.put(item, timeout=1)
+                break
+            except queue.Full:
+                continue
+        
+        if isinstance(item, Exception):
+            return
+
+
+def run_model_detection(model_name, model_instance, pre):
+    """Run detection for a single model on the shared preprocessed input"""
+    try:
+        detection_result = model_instance.detect_pre(pre)
         return model_name, detection_result, None
     except Exception as e:
         error_data = {
@@ -30,84 +87,116 @@ def run_model_detection(model_name, model_instance, image_data):
         return model_name, None, error_data
 
 
-def run_detection_cycle_parallel(plugin, models, max_workers=3, publish_image=False):
-    """Run a single detection cycle with all models in parallel"""
-    with Camera("bottom_camera") as camera:
-        snapshot = camera.snapshot()
-    
+def run_detection_cycle(plugin, snapshot, models, preprocess, publish_image=False):
+    """Run a single detection cycle with all models on one preprocessed snapshot"""
     timestamp = snapshot.timestamp
     
     if publish_image:
-        snapshot.save("snapshot.jpg")
-        plugin.upload_file("snapshot.jpg", timestamp=timestamp)
+        snapshot.save(SNAPSHOT_PATH)
+        plugin.upload_file(SNAPSHOT_PATH, timestamp=timestamp)
     
+    pre = preprocess(snapshot.data)
     all_results = {}
     
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_model = {
-            executor.submit(
-                run_model_detection, 
-                model_name, 
-                model_instance, 
-                snapshot.data
-            ): model_name 
-            for model_name, model_instance in models.items()
-        }
-        
-        for future in as_completed(future_to_model):
-            model_name, result, error = future.result()
-            if result is not None:
-                all_results[model_name] = result
-            else:
-                plugin.publish(
-                    f"model.error.{model_name.lower()}", 
-                    json.dumps(error), 
-                    timestamp=timestamp
-                )
+    for model_name, model_instance in models.items():
+        model_name, result, error = run_model_detection(model_name, model_instance, pre)
+        if result is not None:
+            all_results[model_name] = result
+        else:
+            plugin.publish(
+                f"model.error.{model_name.lower()}", 
+                orjson.dumps(error).decode(), 
+                timestamp=timestamp
+            )
     
     combined_data = {
         "image_timestamp_ns": timestamp,
         "models_results": all_results
     }
-    plugin.publish("object.detections.all", json.dumps(combined_data), timestamp=timestamp)
+    plugin.publish("object.detections.all", orjson.dumps(combined_data).decode(), timestamp=timestamp)
     
     return timestamp
 
 
 def main():
-    start_time = time.time()
     max_duration = 3 * 3600 - 180
+    # monotonic clock so NTP steps on the node cannot shorten or stretch the run
+    deadline = time.monotonic() + max_duration
     
-    from yolo_models import YOLOv8n, YOLOv5n, YOLOv10n
+    # size the native thread pools to the CPU quota of this container before
+    # torch/onnxruntime are imported; cpu_count() reports every host core
+    num_threads = available_cpus()
+    os.environ["OMP_NUM_THREADS"] = str(num_threads)
+    os.environ["MKL_NUM_THREADS"] = str(num_threads)
     
-    num_cores = multiprocessing.cpu_count()
-    max_workers = min(3, num_cores, 3)
+    from yolo_models import YOLOv8n, YOLOv5n, YOLOv10n, Preprocessor
+    
+    preprocess = Preprocessor()
     
     with Plugin() as plugin:
         try:
             models = {
-                "YOLOv8n": YOLOv8n(),
-                "YOLOv5n": YOLOv5n(),
-                "YOLOv10n": YOLOv10n()
+                "YOLOv8n": YOLOv8n(num_threads),
+                "YOLOv5n": YOLOv5n(num_threads),
+                "YOLOv10n": YOLOv10n(num_threads)
             }
             
+            # first inference pays for lazy session/engine setup, keep it out of the loop
+            warmup = preprocess(np.zeros((640, 640, 3), dtype=np.uint8))
+            for model_name, model_instance in models.items():
+                _, _, error = run_model_detection(model_name, model_instance, warmup)
+                if error is not None:
+                    plugin.publish(f"model.error.{model_name.lower()}", orjson.dumps(error).decode())
+            
             image_published = False
             last_publish_minute = -1
             
-            while (time.time() - start_time) < max_duration:
-                current_minute = datetime.now().minute
-                
-                if current_minute % 5 == 0 and current_minute != last_publish_minute:
-                    publish_image = True
-                    image_published = True
-                    last_publish_minute = current_minute
-                else:
-                    publish_image = False
-                
-                timestamp = run_detection_cycle_parallel(
-                    plugin, models, max_workers, 
-                    publish_image=publish_image
+            # keep the capture open for the whole run instead of reopening it every cycle
+            # and take the next snapshot while the models work on the current one
+            snapshot_queue = queue.Queue(maxsize=1)
+            frame_requested = threading.Event()
+            frame_requested.set()
+            stop_event = threading.Event()
+            
+            # BGR matches the Preprocessor, the COCO calibration images and the
+            # Ultralytics convention, and skips pywaggle's per-frame RGB conversion
+            with Camera("bottom_camera", format=BGR) as camera:
+                producer = threading.Thread(
+                    target=capture_snapshots,
+                    args=(camera, snapshot_queue, frame_requested, stop_event),
+                    daemon=True
                 )
+                producer.start()
+                
+                try:
+                    while time.monotonic() < deadline:
+                        # a stalled camera must not hold the loop past the deadline
+                        try:
+                            snapshot = snapshot_queue.get(timeout=max(0, deadline - time.monotonic()))
+                        except queue.Empty:
+                            break
+                        if isinstance(snapshot, Exception):
+                            raise snapshot
+                        frame_requested.set()
+                        
+                        # decide on the frame's own capture time, not when it is processed
+                        current_minute = datetime.fromtimestamp(snapshot.timestamp / 1e9).minute
+                        
+                        if current_minute % 5 == 0 and current_minute != last_publish_minute:
+                            publish_image = True
+                            image_published = True
+                            last_publish_minute = current_minute
+                        else:
+                            publish_image = False
+                        
+                        timestamp = run_detection_cycle(
+                            plugin, snapshot, models, preprocess, 
+                            publish_image=publish_image
+                        )
+                finally:
+                    stop_event.set()
+                    # a producer stuck in camera.snapshot() is a daemon, don't wait on it
+                    producer.join(timeout=5)
             
         except Exception as e:
             error_data = {
@@ -117,7 +206,7 @@ def main():
                 "traceback": traceback.format_exc()
             }
             
-            plugin.publish("plugin.error", json.dumps(error_data))
+            plugin.publish("plugin.error", orjson.dumps(error_data).decode())
             raise
     
     sys.exit(0)
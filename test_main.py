@@ -0,0 +1,111 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from main import available_cpus, capture_snapshots
+
+
+class FakeCamera:
+    def __init__(self, fail_after=None):
+        self.snapshots = 0
+        self.fail_after = fail_after
+
+    def snapshot(self):
+        if self.fail_after is not None and self.snapshots >= self.fail_after:
+            raise RuntimeError("camera unplugged")
+        self.snapshots += 1
+        return self.snapshots
+
+
+def start_producer(camera):
+    snapshot_queue = queue.Queue(maxsize=1)
+    frame_requested = threading.Event()
+    frame_requested.set()
+    stop_event = threading.Event()
+    producer = threading.Thread(
+        target=capture_snapshots,
+        args=(camera, snapshot_queue, frame_requested, stop_event),
+        daemon=True
+    )
+    producer.start()
+    return producer, snapshot_queue, frame_requested, stop_event
+
+
+def test_capture_takes_one_snapshot_per_cycle():
+    camera = FakeCamera()
+    producer, snapshot_queue, frame_requested, stop_event = start_producer(camera)
+
+    frames = []
+    for _ in range(5):
+        frames.append(snapshot_queue.get(timeout=5))
+        frame_requested.set()
+        time.sleep(0.05)  # inference
+
+    stop_event.set()
+    producer.join(timeout=5)
+
+    assert frames == [1, 2, 3, 4, 5]
+    # one frame of lookahead at most
+    assert camera.snapshots <= 6
+    assert not producer.is_alive()
+
+
+def test_capture_waits_while_the_models_are_busy():
+    camera = FakeCamera()
+    producer, snapshot_queue, frame_requested, stop_event = start_producer(camera)
+
+    snapshot_queue.get(timeout=5)
+    time.sleep(0.2)
+
+    assert camera.snapshots == 1
+
+    stop_event.set()
+    producer.join(timeout=5)
+    assert not producer.is_alive()
+
+
+def test_capture_hands_camera_errors_to_the_main_loop():
+    camera = FakeCamera(fail_after=1)
+    producer, snapshot_queue, frame_requested, stop_event = start_producer(camera)
+
+    assert snapshot_queue.get(timeout=5) == 1
+    frame_requested.set()
+    error = snapshot_queue.get(timeout=5)
+
+    assert isinstance(error, RuntimeError)
+    producer.join(timeout=5)
+    assert not producer.is_alive()
+
+@pytest.fixture
+def eight_cores(monkeypatch):
+    monkeypatch.setattr("os.sched_getaffinity", lambda pid: set(range(8)))
+
+
+@pytest.mark.parametrize("cpu_max, expected", [
+    ("200000 100000\n", 2),
+    ("150000 100000\n", 2),
+    ("2000000 100000\n", 8),
+    ("max 100000\n", 8),
+])
+def test_available_cpus_reads_cgroup_v2_quota(tmp_path, eight_cores, cpu_max, expected):
+    (tmp_path / "cpu.max").write_text(cpu_max)
+
+    assert available_cpus(str(tmp_path)) == expected
+
+
+@pytest.mark.parametrize("quota, expected", [
+    ("300000\n", 3),
+    ("-1\n", 8),
+])
+def test_available_cpus_reads_cgroup_v1_quota(tmp_path, eight_cores, quota, expected):
+    (tmp_path / "cpu").mkdir()
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text(quota)
+    (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+
+    assert available_cpus(str(tmp_path)) == expected
+
+
+def test_available_cpus_without_cgroup_files(tmp_path, eight_cores):
+    assert available_cpus(str(tmp_path)) == 8
\ No newline at end of file
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from yolo_utils import Letterbox, Preprocessor, non_max_suppression, postprocess
+
+
+NUM_CLASSES = 80
+
+
+def anchor_output(anchors):
+    """Build a raw [1, 4 + num_classes, num_anchors] output from (cx, cy, w, h, cls, score)"""
+    output = np.zeros((1, 4 + NUM_CLASSES, len(anchors)), dtype=np.float32)
+    for i, (cx, cy, w, h, cls, score) in enumerate(anchors):
+        output[0, :4, i] = [cx, cy, w, h]
+        output[0, 4 + cls, i] = score
+    return output
+
+
+def identity_letterbox(shape=(640, 640)):
+    return Letterbox(None, 1.0, (0, 0), shape)
+
+
+def test_nms_suppresses_overlapping_boxes_by_score():
+    boxes = np.array([[0, 0, 100, 100], [5, 5, 105, 105], [200, 200, 300, 300]], dtype=np.float32)
+    scores = np.array([0.8, 0.9, 0.7], dtype=np.float32)
+
+    keep = non_max_suppression(boxes, scores, 0.7)
+
+    assert keep.tolist() == [1, 2]
+
+
+def test_postprocess_keeps_overlapping_boxes_of_different_classes():
+    output = anchor_output([
+        (50, 50, 100, 100, 0, 0.9),
+        (52, 52, 100, 100, 0, 0.8),
+        (50, 50, 100, 100, 2, 0.6),
+    ])
+
+    boxes, scores, classes = postprocess(output, identity_letterbox())
+
+    assert classes.tolist() == [0, 2]
+    np.testing.assert_allclose(scores, [0.9, 0.6])
+    np.testing.assert_allclose(boxes, [[0, 0, 100, 100], [0, 0, 100, 100]])
+
+
+def test_postprocess_end_to_end_output():
+    output = np.zeros((1, 300, 6), dtype=np.float32)
+    output[0, 0] = [10, 20, 110, 220, 0.9, 5]
+    output[0, 1] = [30, 40, 60, 80, 0.1, 7]
+    output[0, 2] = [300, 300, 400, 500, 0.5, 16]
+
+    boxes, scores, classes = postprocess(output, identity_letterbox())
+
+    assert classes.tolist() == [5, 16]
+    np.testing.assert_allclose(scores, [0.9, 0.5])
+    np.testing.assert_allclose(boxes, [[10, 20, 110, 220], [300, 300, 400, 500]])
+
+
+@pytest.mark.parametrize("output", [
+    anchor_output([(50, 50, 100, 100, 0, 0.1)]),
+    np.zeros((1, 300, 6), dtype=np.float32),
+])
+def test_postprocess_without_detections(output):
+    boxes, scores, classes = postprocess(output, identity_letterbox())
+
+    assert boxes.shape == (0, 4)
+    assert len(scores) == len(classes) == 0
+
+
+def test_postprocess_maps_boxes_back_to_the_original_frame():
+    # a 240x320 frame is scaled 2x to 480x640 and padded by 80 rows on top
+    pre = Letterbox(None, 2.0, (0, 80), (240, 320))
+    output = np.zeros((1, 300, 6), dtype=np.float32)
+    output[0, 0] = [100, 180, 300, 380, 0.9, 0]
+    output[0, 1] = [600, 40, 700, 600, 0.9, 1]
+
+    boxes, _, _ = postprocess(output, pre)
+
+    np.testing.assert_allclose(boxes, [[50, 50, 150, 150], [300, 0, 320, 240]])
+
+
+def test_preprocessor_letterboxes_into_rgb_chw():
+    image = np.zeros((240, 320, 3), dtype=np.uint8)
+    image[..., 0] = 255  # pure blue in BGR
+
+    pre = Preprocessor(640)(image)
+
+    assert pre.tensor.shape == (1, 3, 640, 640)
+    assert pre.ratio == 2.0
+    assert pre.pad == (0, 80)
+    np.testing.assert_allclose(pre.tensor[0, :, :80], 114 / 255, rtol=1e-6)
+    np.testing.assert_allclose(pre.tensor[0, :, 560:], 114 / 255, rtol=1e-6)
+    np.testing.assert_allclose(pre.tensor[0, 2, 80:560], 1.0)
+    np.testing.assert_allclose(pre.tensor[0, :2, 80:560], 0.0)
+
+
+def test_preprocessor_reuses_its_buffers():
+    preprocess = Preprocessor(640)
+    first = preprocess(np.full((480, 640, 3), 10, dtype=np.uint8))
+    second = preprocess(np.full((480, 640, 3), 200, dtype=np.uint8))
+
+    assert first.tensor is second.tensor
+    np.testing.assert_allclose(second.tensor[0, :, 80:560], 200 / 255, rtol=1e-6)
\ No newline at end of file
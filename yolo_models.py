@@ -1,75 +1,155 @@
-from ultralytics import YOLO
+from collections import Counter
+import onnxruntime as ort
+import ast
 import os
+import sys
 import time
 
+from yolo_utils import Preprocessor, postprocess
+
 
 class YOLOModel:
     """Base class for YOLO model handling"""
-    
-    def __init__(self, model_name, model_path):
+
+    providers = ["CPUExecutionProvider"]
+    tensorrt = True
+
+    def __init__(self, model_name, model_path, weights_path, num_threads=None):
         self.model_name = model_name
         self.model_path = model_path
+        self.weights_path = weights_path
+        self.engine_path = os.path.splitext(weights_path)[0] + ".engine"
+        self.imgsz = 640
+        self.num_threads = num_threads
+        self.session = None
         self.model = None
+        self._preprocess = None
         self._load_model()
-    
+
     def _load_model(self):
-        """Load the YOLO model"""
+        """Load a TensorRT engine on NVIDIA GPUs, the ONNX model otherwise"""
+        # imported here so the NumPy pipeline in yolo_utils loads without torch,
+        # and CPU-only nodes never import Ultralytics
+        import torch
+
+        if self.tensorrt and torch.cuda.is_available():
+            try:
+                self._load_engine()
+                return
+            except Exception as e:
+                print(f"TensorRT unavailable for {self.model_name}, using ONNX Runtime: {e}", file=sys.stderr)
+                self.model = None
+        self._load_session()
+
+    def _load_engine(self):
+        """Load the FP16 TensorRT engine, building it on first use"""
+        from ultralytics import YOLO
+        from ultralytics.nn.autobackend import AutoBackend
+        import torch
+
+        if not os.path.exists(self.engine_path):
+            if not os.path.exists(self.weights_path):
+                raise FileNotFoundError(f"Model not found at {self.weights_path}")
+            # engines are specific to the GPU they are built on, so they cannot
+            # be exported at image build time like the ONNX models
+            YOLO(self.weights_path).export(
+                format="engine", half=True, imgsz=self.imgsz, workspace=4, device=0
+            )
+        self.device = torch.device("cuda", 0)
+        self.model = AutoBackend(self.engine_path, device=self.device, fp16=True)
+        self._set_names(self.model.names)
+
+    def _load_session(self):
+        """Load the exported ONNX model into an ONNX Runtime session"""
         if not os.path.exists(self.model_path):
             raise FileNotFoundError(f"Model not found at {self.model_path}")
-        self.model = YOLO(self.model_path)
-    
+
+        options = ort.SessionOptions()
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+        options.inter_op_num_threads = 1
+        # models run one after another, so idle pools must not spin on the cores
+        # the running model needs
+        options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+        self.session = ort.InferenceSession(self.model_path, sess_options=options, providers=self.providers)
+
+        model_input = self.session.get_inputs()[0]
+        if model_input.shape[2:] != [self.imgsz, self.imgsz]:
+            raise ValueError(f"{self.model_path} expects {model_input.shape[2:]} inputs, not {self.imgsz}")
+        self.input_name = model_input.name
+        self._set_names(ast.literal_eval(self.session.get_modelmeta().custom_metadata_map["names"]))
+
+    def _set_names(self, names):
+        """Store the {id: name} class map as a tuple indexed by class id"""
+        self.names = tuple(names[i] for i in range(len(names)))
+
+    def _detect_engine(self, pre):
+        """Run the TensorRT engine directly with NumPy postprocessing"""
+        import torch
+
+        # calling the backend skips the generic Ultralytics predictor, which
+        # re-checks and re-dispatches every input
+        with torch.inference_mode():
+            output = self.model(pre.to_device(self.device))
+        if isinstance(output, (list, tuple)):
+            output = output[0]
+        return postprocess(output.float().cpu().numpy(), pre)
+
+    def _detect_session(self, pre):
+        """Run the ONNX model with NumPy postprocessing"""
+        output = self.session.run(None, {self.input_name: pre.tensor})[0]
+        return postprocess(output, pre)
+
     def detect(self, image):
         """Run detection on an image"""
+        if self._preprocess is None:
+            self._preprocess = Preprocessor(self.imgsz)
+        return self.detect_pre(self._preprocess(image))
+
+    def detect_pre(self, pre):
+        """Run detection on an already letterboxed input"""
         start_time = time.time()
-        results = self.model(image)
+        if self.model is not None:
+            boxes, scores, classes = self._detect_engine(pre)
+        else:
+            boxes, scores, classes = self._detect_session(pre)
         inference_time = time.time() - start_time
-        
-        detections = []
-        for result in results:
-            boxes = result.boxes
-            if boxes is not None:
-                for box in boxes:
-                    cls = int(box.cls.item())
-                    cls_name = self.model.names[cls]
-                    conf = box.conf.item()
-                    x1, y1, x2, y2 = box.xyxy[0].tolist()
-                    
-                    detections.append({
-                        "class": cls_name,
-                        "confidence": conf,
-                        "bbox": [x1, y1, x2, y2]
-                    })
-        
-        class_counts = {}
-        for det in detections:
-            class_name = det["class"]
-            class_counts[class_name] = class_counts.get(class_name, 0) + 1
-        
+
+        class_names = [self.names[c] for c in classes.tolist()]
+
         return {
             "model": self.model_name,
-            "detections": detections,
-            "counts": class_counts,
-            "total_objects": len(detections),
+            "detections": {
+                "class": class_names,
+                "confidence": scores.tolist(),
+                "bbox": boxes.tolist()
+            },
+            "counts": dict(Counter(class_names)),
+            "total_objects": len(class_names),
             "inference_time_seconds": inference_time
         }
 
 
 class YOLOv8n(YOLOModel):
     """YOLOv8n model handler"""
-    
-    def __init__(self):
-        super().__init__("YOLOv8n", "/app/models/yolov8n.pt")
+
+    def __init__(self, num_threads=None):
+        super().__init__("YOLOv8n", "/app/models/yolov8n.onnx", "/app/models/yolov8n.pt", num_threads)
 
 
 class YOLOv5n(YOLOModel):
     """YOLOv5n model handler"""
-    
-    def __init__(self):
-        super().__init__("YOLOv5n", "/app/models/yolov5nu.pt")
+
+    tensorrt = False
+
+    def __init__(self, num_threads=None):
+        super().__init__("YOLOv5n", "/app/models/yolov5nu_int8.onnx", "/app/models/yolov5nu.pt", num_threads)
 
 
 class YOLOv10n(YOLOModel):
     """YOLOv10n model handler"""
-    
-    def __init__(self):
-        super().__init__("YOLOv10n", "/app/models/yolov10n.pt")
\ No newline at end of file
+
+    tensorrt = False
+
+    def __init__(self, num_threads=None):
+        super().__init__("YOLOv10n", "/app/models/yolov10n_int8.onnx", "/app/models/yolov10n.pt", num_threads)
\ No newline at end of file
@@ -0,0 +1,128 @@
+import numpy as np
+import cv2
+
+
+class Letterbox:
+    """Preprocessed input shared by every model in a detection cycle"""
+
+    def __init__(self, tensor, ratio, pad, shape):
+        self.tensor = tensor
+        self.ratio = ratio
+        self.pad = pad
+        self.shape = shape
+        self._device_tensor = None
+
+    def to_device(self, device):
+        """Upload the input as float16 once and share it between GPU models"""
+        import torch
+
+        if self._device_tensor is None or self._device_tensor.device != device:
+            self._device_tensor = torch.from_numpy(self.tensor).to(device).half()
+        return self._device_tensor
+
+
+class Preprocessor:
+    """Letterboxes frames into buffers that are reused across cycles"""
+
+    def __init__(self, imgsz=640):
+        self.imgsz = imgsz
+        self.tensor = np.empty((1, 3, imgsz, imgsz), dtype=np.float32)
+        self._canvas = np.empty((imgsz, imgsz, 3), dtype=np.uint8)
+        self._rgb = np.empty_like(self._canvas)
+        self._resized = None
+        self._shape = None
+
+    def _set_geometry(self, shape):
+        """Compute the resize and padding for a frame size and reset the canvas"""
+        h, w = shape
+        self.ratio = min(self.imgsz / h, self.imgsz / w)
+        new_w, new_h = int(round(w * self.ratio)), int(round(h * self.ratio))
+        left = int(round((self.imgsz - new_w) / 2 - 0.1))
+        top = int(round((self.imgsz - new_h) / 2 - 0.1))
+
+        self.pad = (left, top)
+        self._roi = (slice(top, top + new_h), slice(left, left + new_w))
+        self._resized = np.empty((new_h, new_w, 3), dtype=np.uint8) if (new_w, new_h) != (w, h) else None
+        self._canvas.fill(114)
+        self._shape = shape
+
+    def __call__(self, image):
+        """Letterbox an image once so all models can run on the same tensor"""
+        shape = image.shape[:2]
+        if shape != self._shape:
+            self._set_geometry(shape)
+
+        # the padding around the ROI keeps its fill value between frames
+        if self._resized is not None:
+            new_h, new_w = self._resized.shape[:2]
+            cv2.resize(image, (new_w, new_h), dst=self._resized, interpolation=cv2.INTER_LINEAR)
+            self._canvas[self._roi] = self._resized
+        else:
+            self._canvas[self._roi] = image
+        cv2.cvtColor(self._canvas, cv2.COLOR_BGR2RGB, dst=self._rgb)
+
+        # RGB HWC -> CHW, scaled to [0, 1]
+        np.multiply(self._rgb.transpose(2, 0, 1), 1 / 255.0, out=self.tensor[0], dtype=np.float32)
+        return Letterbox(self.tensor, self.ratio, self.pad, shape)
+
+
+def non_max_suppression(boxes, scores, iou_threshold):
+    """Greedy NMS over xyxy boxes, returns kept indices by descending score"""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        h = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-7)
+        order = rest[iou <= iou_threshold]
+
+    return np.array(keep, dtype=np.intp)
+
+
+def scale_boxes(boxes, pre):
+    """Map xyxy boxes from letterboxed input space back onto the original image"""
+    left, top = pre.pad
+    boxes[:, [0, 2]] -= left
+    boxes[:, [1, 3]] -= top
+    boxes /= pre.ratio
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, pre.shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, pre.shape[0])
+    return boxes
+
+
+def postprocess(output, pre, conf_threshold=0.25, iou_threshold=0.7, max_det=300):
+    """Decode raw YOLO output into boxes, scores and class ids in image coordinates"""
+    pred = output[0]
+
+    if pred.shape[-1] == 6:
+        # end-to-end heads (YOLOv10) emit [x1, y1, x2, y2, score, class] after NMS
+        pred = pred[pred[:, 4] > conf_threshold][:max_det]
+        boxes = pred[:, :4].copy()
+        scores = pred[:, 4]
+        classes = pred[:, 5].astype(np.intp)
+    else:
+        # [4 + num_classes, num_anchors] with cx, cy, w, h box rows
+        pred = pred.T
+        class_scores = pred[:, 4:]
+        classes = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(classes)), classes]
+        mask = scores > conf_threshold
+        pred, scores, classes = pred[mask], scores[mask], classes[mask]
+
+        boxes = np.empty((len(pred), 4), dtype=np.float32)
+        boxes[:, :2] = pred[:, :2] - pred[:, 2:4] / 2
+        boxes[:, 2:] = pred[:, :2] + pred[:, 2:4] / 2
+
+        # offset boxes per class so NMS never suppresses across classes
+        offsets = classes[:, None].astype(np.float32) * 7680
+        keep = non_max_suppression(boxes + offsets, scores, iou_threshold)[:max_det]
+        boxes, scores, classes = boxes[keep], scores[keep], classes[keep]
+
+    return scale_boxes(boxes, pre), scores, classes
\ No newline at end of file